@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Маленький потокобезопасный LRU с временем жизни записей (в памяти процесса).
+
+    Другие воркеры про инвалидацию не узнают — для них запись живёт до ttl.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[object, tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            if hit[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# id -> (change_seq, карточка заказа для админки); сбрасывается при approve/reject,
+# на других воркерах устаревшую карточку отсекает сверка change_seq в routers/admin.py
+order_details_cache = TTLCache(ttl=30, maxsize=2048)
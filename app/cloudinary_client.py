@@ -1,14 +1,25 @@
 import os
-import cloudinary
-import cloudinary.uploader
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True,
-)
+_configured = False
+
+
+def _cloudinary():
+    # cloudinary тянет requests/urllib3 — грузим при первой загрузке, а не при старте воркера
+    global _configured
+    import cloudinary
+    import cloudinary.uploader
+
+    if not _configured:
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key=os.getenv("CLOUDINARY_API_KEY"),
+            api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+            secure=True,
+        )
+        _configured = True
+    return cloudinary
+
 
 def upload_image(file) -> str:
-    result = cloudinary.uploader.upload(file.file)
+    result = _cloudinary().uploader.upload(file.file)
     return result["secure_url"]
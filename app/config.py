@@ -3,4 +3,18 @@ from datetime import timedelta
 
 SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_SUPER_SECRET")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 часа
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 часа
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+
+RATE_LIMIT_IP_CAPACITY = int(os.getenv("RATE_LIMIT_IP_CAPACITY", "60"))
+RATE_LIMIT_USER_CAPACITY = int(os.getenv("RATE_LIMIT_USER_CAPACITY", "30"))
+RATE_LIMIT_REFILL_PER_SEC = float(os.getenv("RATE_LIMIT_REFILL_PER_SEC", "0.5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+REPORT_CONCURRENCY = int(os.getenv("REPORT_CONCURRENCY", "2"))
+# адреса/сети reverse-proxy через запятую; только им верим в X-Forwarded-For
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
@@ -1,8 +1,13 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only
+from sqlalchemy import func, select, update, insert, bindparam, case, union_all, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from . import models, schemas
 from .auth import hash_password
+from .jwt_utils import evict_user
 from app.services.discount import calculate_discount
+from app import idempotency
+from app.cache import order_details_cache
+from app.events import order_events, order_payload
 
 from datetime import datetime
 
@@ -29,13 +34,112 @@ def create_product(db: Session, product: schemas.ProductCreate):
     db.refresh(new_product)
     return new_product
 
+IMPORT_BATCH_SIZE = 500
+
+def bulk_upsert_products(db: Session, products: list[dict], types: list[tuple[str, str, str]]):
+    """Upsert товаров по sku и их типов по (товар, название) одной транзакцией."""
+    created = updated = 0
+    product_ids = {}
+
+    try:
+        for i in range(0, len(products), IMPORT_BATCH_SIZE):
+            batch = products[i:i + IMPORT_BATCH_SIZE]
+            skus = [p["sku"] for p in batch]
+            existing = set(db.scalars(select(models.Product.sku).where(models.Product.sku.in_(skus))))
+            updated += len(existing)
+            created += len(batch) - len(existing)
+
+            stmt = sqlite_insert(models.Product).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.Product.sku],
+                set_={c: stmt.excluded[c] for c in ("name", "price", "discount_percent", "active")},
+            )
+            db.execute(stmt)
+            product_ids.update(db.execute(
+                select(models.Product.sku, models.Product.id).where(models.Product.sku.in_(skus))
+            ).all())
+
+        # последняя строка с тем же (sku, тип) побеждает
+        wanted = {(product_ids[sku], name): url for sku, name, url in types}
+
+        if wanted:
+            ids = list({pid for pid, _ in wanted})
+            existing_types = set()
+            for i in range(0, len(ids), IMPORT_BATCH_SIZE):
+                chunk = ids[i:i + IMPORT_BATCH_SIZE]
+                existing_types.update(db.execute(
+                    select(models.ProductType.product_id, models.ProductType.name)
+                    .where(models.ProductType.product_id.in_(chunk))
+                ).all())
+
+            to_update = [
+                {"pid": pid, "tname": name, "url": url}
+                for (pid, name), url in wanted.items() if (pid, name) in existing_types
+            ]
+            to_insert = [
+                {"product_id": pid, "name": name, "image_url": url}
+                for (pid, name), url in wanted.items() if (pid, name) not in existing_types
+            ]
+            pt = models.ProductType.__table__
+            if to_update:
+                db.execute(
+                    update(pt)
+                    .where(pt.c.product_id == bindparam("pid"), pt.c.name == bindparam("tname"))
+                    .values(image_url=bindparam("url")),
+                    to_update,
+                )
+            if to_insert:
+                db.execute(insert(pt), to_insert)
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {"created": created, "updated": updated, "types": len(wanted)}
+
+def get_catalog_for_export(db: Session):
+    return (
+        db.query(models.Product)
+        .options(selectinload(models.Product.types))
+        .order_by(models.Product.id)
+        .yield_per(IMPORT_BATCH_SIZE)
+    )
+
 def get_active_products(db: Session):
-    return db.query(models.Product).filter(models.Product.active == True).all()
+    return (
+        db.query(models.Product)
+        .options(selectinload(models.Product.types))
+        .filter(models.Product.active == True)
+        .all()
+    )
 
 def admin_get_products(db: Session):
     return db.query(models.Product).all()
 
-def create_order(db: Session, user: models.User, order: schemas.OrderCreate):
+def next_change_seq():
+    """Подзапрос max(change_seq) + 1 по живым и архивным заказам. Вычисляется
+    внутри того же INSERT/UPDATE: SQLite держит одного писателя до коммита,
+    поэтому номера растут в порядке коммитов и не зависят от часов воркеров."""
+    return select(func.max(
+        func.coalesce(select(func.max(models.Order.change_seq)).scalar_subquery(), 0),
+        func.coalesce(select(func.max(models.ArchivedOrder.change_seq)).scalar_subquery(), 0),
+    ) + 1).scalar_subquery()
+
+
+def current_change_seq(db: Session) -> int:
+    live = db.scalar(select(func.max(models.Order.change_seq))) or 0
+    archived = db.scalar(select(func.max(models.ArchivedOrder.change_seq))) or 0
+    return max(live, archived)
+
+
+def create_order(
+    db: Session,
+    user: models.User,
+    order: schemas.OrderCreate,
+    idempotency_key: str | None = None,
+    request_hash: str | None = None,
+):
     items_db = []
     total_amount = 0.0
 
@@ -45,6 +149,7 @@ def create_order(db: Session, user: models.User, order: schemas.OrderCreate):
             raise ValueError("Product not found or inactive")
         
         type_id = getattr(it, "type_id", None)
+        t = None
         if type_id is not None:
             t = (
                 db.query(models.ProductType)
@@ -68,6 +173,11 @@ def create_order(db: Session, user: models.User, order: schemas.OrderCreate):
             product_discount_percent=prod_disc,
             price=unit_price,
             product_type_id=it.type_id,
+            product_name=product.name,
+            type_name=t.name if t else None,
+            type_image_url=t.image_url if t else None,
+            product=product,
+            type=t,
         ))
 
     user_discount_percent = int(user.discount or 0)
@@ -84,7 +194,13 @@ def create_order(db: Session, user: models.User, order: schemas.OrderCreate):
         .filter(models.Order.user_id == user.id)
         .scalar()
     )
-    next_num = (last_num or 0) + 1
+    # номера продолжаются после заказов, ушедших в архив
+    archived_num = (
+        db.query(func.max(models.ArchivedOrder.user_order_number))
+        .filter(models.ArchivedOrder.user_id == user.id)
+        .scalar()
+    )
+    next_num = max(last_num or 0, archived_num or 0) + 1
 
     new_order = models.Order(
         user_id=user.id,
@@ -94,12 +210,32 @@ def create_order(db: Session, user: models.User, order: schemas.OrderCreate):
         final_amount=final_amount,
         payment_method=order.payment_method,
         status="pending",
+        change_seq=next_change_seq(),
         items=items_db,
     )
 
     db.add(new_order)
+
+    if idempotency_key:
+        # ключ и готовый ответ пишем в той же транзакции, что и заказ
+        db.flush()
+        response = schemas.OrderOut.model_validate(new_order).model_dump_json()
+        expires = idempotency.expires_at()
+        db.add(models.IdempotencyKey(
+            user_id=user.id,
+            key=idempotency_key,
+            request_hash=request_hash,
+            order_id=new_order.id,
+            response=response,
+            expires_at=expires,
+        ))
+
     db.commit()
     db.refresh(new_order)
+    order_events.publish("order_created", order_payload(new_order))
+
+    if idempotency_key:
+        idempotency.remember(user.id, idempotency_key, request_hash, response, expires)
     return new_order
 
 
@@ -108,7 +244,6 @@ def approve_order(db: Session, order_id: int):
         db.query(models.Order)
         .options(joinedload(models.Order.user), 
         joinedload(models.Order.items), 
-        joinedload(models.Order.items).joinedload(models.OrderItem.type),
         )
         .filter(models.Order.id == order_id)
         .first()
@@ -120,6 +255,8 @@ def approve_order(db: Session, order_id: int):
         return order
 
     order.status = "approved"
+    order.updated_at = datetime.utcnow()
+    order.change_seq = next_change_seq()
 
     user = order.user  
     if not user:
@@ -129,7 +266,9 @@ def approve_order(db: Session, order_id: int):
     user.discount = calculate_discount(user.orders_count)
 
     db.commit()
+    order_details_cache.pop(order_id)
     db.refresh(order)
+    order_events.publish("order_updated", order_payload(order))
     return order
 
 def reject_order(db: Session, order_id: int):
@@ -141,40 +280,160 @@ def reject_order(db: Session, order_id: int):
         raise ValueError("Only pending orders can be rejected")
 
     order.status = "rejected"
+    order.updated_at = datetime.utcnow()
+    order.change_seq = next_change_seq()
     db.commit()
+    order_details_cache.pop(order_id)
     db.refresh(order)
+    order_events.publish("order_updated", order_payload(order))
     return order
 
-def get_user_orders(db: Session, user_id: int):
+def get_orders_with_details(db: Session, ids: list[int]):
+    """Заказы с пользователем и позициями за фиксированное число selectin-запросов,
+    независимо от количества ids. Недостающие ищутся в архиве."""
+    if not ids:
+        return []
+    orders = (
+        db.query(models.Order)
+        .options(
+            selectinload(models.Order.user),
+            selectinload(models.Order.items),
+        )
+        .filter(models.Order.id.in_(ids))
+        .all()
+    )
+    rest = set(ids) - {o.id for o in orders}
+    if rest:
+        orders += (
+            db.query(models.ArchivedOrder)
+            .options(
+                selectinload(models.ArchivedOrder.user),
+                selectinload(models.ArchivedOrder.items),
+            )
+            .filter(models.ArchivedOrder.id.in_(rest))
+            .all()
+        )
+    return orders
+
+def get_order_change_seqs(db: Session, ids: list[int]) -> dict[int, int]:
+    """id -> change_seq живых заказов: дешёвая проверка, не устарели ли кэшированные карточки."""
+    rows = db.execute(
+        select(models.Order.id, models.Order.change_seq).where(models.Order.id.in_(ids))
+    )
+    return dict(rows.all())
+
+def archive_needed(db: Session, date_from: datetime | None) -> bool:
+    """Нужно ли подмешивать архив для периода, начинающегося с date_from."""
+    newest = db.query(func.max(models.ArchivedOrder.created_at)).scalar()
+    return newest is not None and (date_from is None or date_from <= newest)
+
+ORDER_SUMMARY_COLUMNS = (
+    "id", "user_order_number", "status", "payment_method",
+    "total_amount", "discount_percent", "final_amount", "created_at", "updated_at",
+)
+ITEM_SUMMARY_COLUMNS = (
+    "id", "order_id", "product_id", "product_type_id", "product_name", "type_name", "quantity", "price",
+)
+
+def order_load_options(order_model, item_model, view: str = "full"):
+    """summary — только нужные колонки заказа и позиций;
+    full — клиент и позиции целиком (товар/тип берутся из полей-снимков);
+    with_product — full плюс текущие товары с типами из каталога (устаревший include_product)."""
+    if view == "summary":
+        return (
+            load_only(*[getattr(order_model, c) for c in ORDER_SUMMARY_COLUMNS]),
+            selectinload(order_model.items).load_only(*[getattr(item_model, c) for c in ITEM_SUMMARY_COLUMNS]),
+        )
+    if view == "with_product":
+        return (
+            selectinload(order_model.user),
+            selectinload(order_model.items).selectinload(item_model.product).selectinload(models.Product.types),
+            selectinload(order_model.items).selectinload(item_model.type),
+        )
     return (
+        selectinload(order_model.user),
+        selectinload(order_model.items),
+    )
+
+def get_user_orders(db: Session, user_id: int, view: str = "full"):
+    live = (
         db.query(models.Order)
-        .options(joinedload(models.Order.items))
+        .options(*order_load_options(models.Order, models.OrderItem, view))
         .filter(models.Order.user_id == user_id)
         .all()
     )
+    archived = (
+        db.query(models.ArchivedOrder)
+        .options(*order_load_options(models.ArchivedOrder, models.ArchivedOrderItem, view))
+        .filter(models.ArchivedOrder.user_id == user_id)
+        .all()
+    )
+    return archived + live
 
 
-def get_orders_for_report(db: Session, date_from: datetime, date_to: datetime):
+def get_user_order_changes(
+    db: Session,
+    user_id: int,
+    after: int | None = None,
+    limit: int = 100,
+    view: str = "summary",
+):
+    """Заказы клиента с change_seq больше курсора, по возрастанию change_seq."""
+    query = (
+        db.query(models.Order)
+        .options(*order_load_options(models.Order, models.OrderItem, view))
+        .filter(models.Order.user_id == user_id)
+    )
+    if after is not None:
+        query = query.filter(models.Order.change_seq > after)
     return (
+        query
+        .order_by(models.Order.change_seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def get_orders_for_report(db: Session, date_from: datetime, date_to: datetime):
+    orders = (
         db.query(models.Order)
         .join(models.User)
         .filter(models.Order.created_at >= date_from)
         .filter(models.Order.created_at <= date_to)
         .all()
     )
+    if archive_needed(db, date_from):
+        orders = (
+            db.query(models.ArchivedOrder)
+            .join(models.User)
+            .filter(models.ArchivedOrder.created_at >= date_from)
+            .filter(models.ArchivedOrder.created_at <= date_to)
+            .all()
+        ) + orders
+    return orders
 
 def get_client_orders_with_items(db, user_id: int, date_from: datetime, date_to: datetime):
-    return (
+    orders = (
         db.query(models.Order)
-        .options(
-            joinedload(models.Order.items).joinedload(models.OrderItem.product), 
-            joinedload(models.Order.items).joinedload(models.OrderItem.type),)
+        .options(joinedload(models.Order.items))
         .filter(models.Order.user_id == user_id)
         .filter(models.Order.created_at >= date_from)
         .filter(models.Order.created_at <= date_to)
         .order_by(models.Order.created_at.desc())
         .all()
     )
+    if archive_needed(db, date_from):
+        # живые pending-заказы могут быть старше архивных, поэтому сортируем общий список
+        orders += (
+            db.query(models.ArchivedOrder)
+            .options(joinedload(models.ArchivedOrder.items))
+            .filter(models.ArchivedOrder.user_id == user_id)
+            .filter(models.ArchivedOrder.created_at >= date_from)
+            .filter(models.ArchivedOrder.created_at <= date_to)
+            .all()
+        )
+        orders.sort(key=lambda o: o.created_at, reverse=True)
+    return orders
 
 def update_product(db: Session, product_id: int, payload):
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
@@ -189,12 +448,45 @@ def update_product(db: Session, product_id: int, payload):
     db.refresh(product)
     return product
 
+def bulk_update_products(db: Session, payload: schemas.ProductBulkUpdate) -> int:
+    """Один UPDATE по всем товарам, подходящим под фильтр. Возвращает число строк."""
+    f = payload.filter
+    conditions = []
+    if f.ids is not None:
+        conditions.append(models.Product.id.in_(f.ids))
+    if f.name_like:
+        # ILIKE в SQLite складывает регистр только у ASCII — сравниваем через casefold (см. database.py)
+        conditions.append(func.casefold(models.Product.name).like(f.name_like.casefold()))
+    if f.active is not None:
+        conditions.append(models.Product.active == f.active)
+
+    values = {}
+    discount = func.coalesce(models.Product.discount_percent, 0)
+    if payload.set_discount_percent is not None:
+        values[models.Product.discount_percent] = payload.set_discount_percent
+    elif payload.adjust_discount_percent is not None:
+        values[models.Product.discount_percent] = func.max(
+            0, func.min(100, discount + payload.adjust_discount_percent)
+        )
+    if payload.scale_price_percent is not None:
+        values[models.Product.price] = func.round(
+            models.Product.price * (1 + payload.scale_price_percent / 100), 2
+        )
+    if payload.set_active is not None:
+        values[models.Product.active] = payload.set_active
+
+    stmt = update(models.Product).where(*conditions).values(values)
+    updated = db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+    db.commit()
+    return updated
+
 def make_user_admin(db: Session, user_id: int):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise ValueError("User not found")
     user.is_admin = True
     db.commit()
+    evict_user(user.id)
     db.refresh(user)
     return user
 
@@ -206,15 +498,15 @@ def admin_get_orders(db: Session, page: int = 1, limit: int = 10, q: str | None
     query = (
       db.query(models.Order)
       .options(joinedload(models.Order.user))  # чтобы o.user не грузился отдельными запросами
-      .join(models.User)
     )
 
     if status and status != "all":
         query = query.filter(models.Order.status == status)
 
     if q:
+        # join на users только для поиска, иначе COUNT идёт по индексу orders
         q_like = f"%{q.strip()}%"
-        query = query.filter(
+        query = query.join(models.User).filter(
             (models.User.name.ilike(q_like)) | (models.User.phone.ilike(q_like))
         )
 
@@ -250,6 +542,69 @@ def admin_get_orders(db: Session, page: int = 1, limit: int = 10, q: str | None
         "limit": limit,
     }
     
+def customer_stats(db: Session, user_ids: list[int]) -> dict[int, dict]:
+    """Агрегаты по заказам (живым и архивным) одним GROUP BY для заданных клиентов."""
+    if not user_ids:
+        return {}
+    parts = [
+        select(
+            m.user_id, m.status, m.final_amount, m.created_at,
+        ).where(m.user_id.in_(user_ids))
+        for m in (models.Order, models.ArchivedOrder)
+    ]
+    o = union_all(*parts).subquery()
+    approved = o.c.status == "approved"
+    rows = db.execute(
+        select(
+            o.c.user_id,
+            func.count().label("total_orders"),
+            func.sum(case((approved, 1), else_=0)).label("approved_orders"),
+            func.coalesce(func.sum(case((approved, o.c.final_amount), else_=0)), 0).label("lifetime_spend"),
+            func.max(o.c.created_at).label("last_order_at"),
+        ).group_by(o.c.user_id)
+    ).mappings().all()
+    return {r["user_id"]: dict(r) for r in rows}
+
+def admin_get_customers(db: Session, cursor: int | None = None, limit: int = 50, q: str | None = None):
+    if limit < 1: limit = 50
+    if limit > 200: limit = 200
+
+    query = db.query(models.User)
+    if cursor:
+        query = query.filter(models.User.id > cursor)
+    if q and q.strip():
+        # поиск по префиксу диапазоном — так работают индексы phone/name
+        prefix = q.strip()
+        upper = prefix + "\U0010ffff"
+        query = query.filter(or_(
+            (models.User.phone >= prefix) & (models.User.phone < upper),
+            (models.User.name >= prefix) & (models.User.name < upper),
+        ))
+
+    users = query.order_by(models.User.id).limit(limit + 1).all()
+    has_more = len(users) > limit
+    users = users[:limit]
+    stats = customer_stats(db, [u.id for u in users])
+
+    items = []
+    for u in users:
+        st = stats.get(u.id, {})
+        items.append({
+            "id": u.id,
+            "phone": u.phone,
+            "name": u.name,
+            "car_brand": u.car_brand,
+            "is_admin": bool(u.is_admin),
+            "discount": u.discount,
+            "orders_count": u.orders_count or 0,
+            "total_orders": st.get("total_orders", 0),
+            "approved_orders": st.get("approved_orders", 0),
+            "lifetime_spend": float(st.get("lifetime_spend", 0)),
+            "last_order_at": st.get("last_order_at"),
+        })
+
+    return {"items": items, "next_cursor": users[-1].id if has_more else None}
+
 def admin_orders_count(db: Session):
     return db.query(func.count(models.Order.id)).scalar() or 0
 
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
@@ -10,6 +10,13 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 
+@event.listens_for(engine, "connect")
+def _register_functions(dbapi_conn, _):
+    # встроенный lower() в SQLite не трогает кириллицу
+    dbapi_conn.create_function(
+        "casefold", 1, lambda s: s.casefold() if isinstance(s, str) else s, deterministic=True
+    )
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
@@ -0,0 +1,84 @@
+"""Pub/sub событий по заказам внутри процесса (для SSE-ленты админки).
+
+crud публикует события из потоков threadpool, подписчики — async-генераторы
+в event loop; доставка через call_soon_threadsafe. Последние события
+хранятся в кольцевом буфере для повтора по Last-Event-ID.
+
+Шина живёт в одном процессе: при нескольких воркерах каждая вкладка
+видит события того воркера, к которому подключилась.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+
+HISTORY_SIZE = 256
+QUEUE_SIZE = 1000
+
+
+def order_payload(order) -> dict:
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "user_order_number": order.user_order_number,
+        "status": order.status,
+        "final_amount": order.final_amount,
+        "payment_method": order.payment_method,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+    }
+
+
+def _deliver(queue: asyncio.Queue, event: dict):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # медленный клиент: пропущенное он доберёт по Last-Event-ID при переподключении
+        pass
+
+
+class EventHub:
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: deque[dict] = deque(maxlen=history_size)
+        self._subscribers: dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+
+    def publish(self, kind: str, data: dict):
+        with self._lock:
+            self._last_id += 1
+            event = {"id": self._last_id, "event": kind, "data": data}
+            self._history.append(event)
+            subscribers = list(self._subscribers.items())
+
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                # loop уже закрыт
+                self.unsubscribe(queue)
+
+    def subscribe(self, last_event_id: int | None = None):
+        """Возвращает (queue, backlog, gap). backlog — события после last_event_id
+        из буфера; gap=True, если часть событий уже вытеснена и клиенту надо
+        перечитать список заказов целиком."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[queue] = loop
+            backlog, gap = [], False
+            if last_event_id is not None:
+                backlog = [e for e in self._history if e["id"] > last_event_id]
+                oldest = self._history[0]["id"] if self._history else self._last_id + 1
+                gap = last_event_id < oldest - 1 or last_event_id > self._last_id
+        return queue, backlog, gap
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+order_events = EventHub()
@@ -0,0 +1,119 @@
+"""Idempotency-Key для POST /orders: сохранённые ответы в idempotency_keys
+плюс LRU в памяти процесса.
+
+Протухшие ключи чистятся отдельным шагом (cron):
+
+    python -m app.idempotency
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_CACHE_SIZE
+
+# (user_id, key) -> (expires_at, request_hash, response_json)
+_cache: "OrderedDict[tuple[int, str], tuple[datetime, str, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# (user_id, key) -> [lock, сколько запросов ждут/держат]
+_key_locks: dict[tuple[int, str], list] = {}
+_key_locks_guard = threading.Lock()
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже использован с другим телом запроса."""
+
+
+def request_hash(payload) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+
+@contextmanager
+def key_lock(user_id: int, key: str):
+    """Сериализует параллельные запросы с одним и тем же ключом внутри процесса.
+    Между процессами дубль ловит уникальный индекс (user_id, key)."""
+    k = (user_id, key)
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(k, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _key_locks.pop(k, None)
+
+
+def remember(user_id: int, key: str, req_hash: str, response: str, expires: datetime):
+    with _cache_lock:
+        _cache[(user_id, key)] = (expires, req_hash, response)
+        _cache.move_to_end((user_id, key))
+        while len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_response(db: Session, user_id: int, key: str, req_hash: str) -> str | None:
+    """Возвращает сохранённый JSON ответа или None, если ключ новый/протух."""
+    now = datetime.utcnow()
+
+    with _cache_lock:
+        hit = _cache.get((user_id, key))
+        if hit is not None:
+            if hit[0] > now:
+                _cache.move_to_end((user_id, key))
+            else:
+                _cache.pop((user_id, key), None)
+                hit = None
+
+    if hit is None:
+        row = (
+            db.query(models.IdempotencyKey)
+            .filter(models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.key == key)
+            .first()
+        )
+        if not row:
+            return None
+        if row.expires_at <= now:
+            # протухший ключ освобождаем, иначе он заблокирует повторное использование
+            db.delete(row)
+            db.commit()
+            return None
+        hit = (row.expires_at, row.request_hash, row.response)
+        remember(user_id, key, *hit[1:], hit[0])
+
+    if hit[1] != req_hash:
+        raise IdempotencyConflict("Idempotency-Key reused with a different request")
+    return hit[2]
+
+
+def purge_expired(db: Session) -> int:
+    deleted = (
+        db.query(models.IdempotencyKey)
+        .filter(models.IdempotencyKey.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"purged idempotency keys: {purge_expired(db)}")
+    finally:
+        db.close()
@@ -1,6 +1,16 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, TOKEN_CACHE_SIZE
+
+# sha256(токен) -> (exp, claims): уже проверенные токены, чтобы не гонять HMAC на каждый запрос
+_verified: "OrderedDict[bytes, tuple[float, dict]]" = OrderedDict()
+# sha256(токен) -> exp: отозванные через logout (в памяти процесса, не больше TOKEN_CACHE_SIZE)
+_revoked: "OrderedDict[bytes, float]" = OrderedDict()
+_lock = threading.Lock()
 
 def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     to_encode = data.copy()
@@ -8,5 +18,54 @@ def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_M
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def _digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
 def decode_token(token: str) -> dict:
-    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
\ No newline at end of file
+    key = _digest(token)
+    now = time.time()
+
+    with _lock:
+        if key in _revoked:
+            raise JWTError("Token revoked")
+        hit = _verified.get(key)
+        if hit is not None:
+            if hit[0] > now:
+                _verified.move_to_end(key)
+                return dict(hit[1])
+            del _verified[key]
+
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+    exp = claims.get("exp")
+    if exp is not None:
+        with _lock:
+            _verified[key] = (float(exp), claims)
+            while len(_verified) > TOKEN_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return dict(claims)
+
+def revoke_token(token: str):
+    """Logout: токен больше не принимается этим процессом до своего exp.
+    Невалидный токен — JWTError, в список отзыва попадают только настоящие."""
+    claims = decode_token(token)
+    exp = float(claims.get("exp") or 0)
+    key = _digest(token)
+    now = time.time()
+    with _lock:
+        _verified.pop(key, None)
+        # заодно чистим истёкшие отзывы
+        for k in [k for k, e in _revoked.items() if e <= now]:
+            del _revoked[k]
+        if exp > now:
+            _revoked[key] = exp
+            # при переполнении теряем самые старые отзывы — они и истекут раньше
+            while len(_revoked) > TOKEN_CACHE_SIZE:
+                _revoked.popitem(last=False)
+
+def evict_user(user_id: int):
+    """Сбрасывает кэш проверенных токенов пользователя (смена роли и т.п.)."""
+    sub = str(user_id)
+    with _lock:
+        for k in [k for k, (_, claims) in _verified.items() if claims.get("sub") == sub]:
+            del _verified[k]
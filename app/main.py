@@ -4,14 +4,18 @@ from fastapi import FastAPI, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 import os
 from app.database import engine, get_db
-from app import models, schemas, crud
+from app import schemas, crud, migrations
 from app.auth import verify_password
 from app.routers import admin, orders, auth, public, users
 from fastapi.middleware.cors import CORSMiddleware
+from app.ratelimit import AdmissionControl
 
 
 app = FastAPI(title="Autoray")
 
+# добавлен до CORS, чтобы ответы 429 тоже получали CORS-заголовки
+app.add_middleware(AdmissionControl)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "https://avtoray.vercel.app", "https://avtoray.kz", "https://www.avtoray.kz",],  
@@ -20,7 +24,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-models.Base.metadata.create_all(bind=engine)
+# схема создаётся отдельным шагом: python -m app.migrations
 
 app.include_router(auth.router)
 app.include_router(public.router)
@@ -32,6 +36,19 @@ app.include_router(users.router)
 def root():
     return {"status": "backend работает"}
 
+@app.get("/ready")
+def ready():
+    # прогреваем пул соединений и проверяем, что миграции применены
+    try:
+        with engine.connect() as conn:
+            version = migrations.current_version(conn)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+    if version < migrations.latest_version():
+        raise HTTPException(status_code=503, detail="Migrations not applied")
+    return {"status": "ready", "schema_version": version}
+
 @app.post("/seed-admin")
 def seed_admin(
     user_id: int,
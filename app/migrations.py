@@ -0,0 +1,150 @@
+"""Миграции схемы БД.
+
+Запускаются отдельным шагом деплоя, а не при импорте приложения:
+
+    python -m app.migrations
+
+Номер применённой миграции хранится в PRAGMA user_version.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+from sqlalchemy import inspect
+
+from app.database import engine
+from app import models
+
+def _baseline(conn):
+    # исходные таблицы уже есть: до миграций их создавал create_all при импорте app.main
+    pass
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    if column not in _columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def _create_indexes(conn):
+    # индексы под фильтры и join'ы из crud.py / routers/admin.py
+    for table in models.Base.metadata.sorted_tables:
+        existing = _columns(conn, table.name)
+        for index in table.indexes:
+            # индексы по ещё не добавленным колонкам создаст миграция, которая их добавляет
+            if {c.name for c in index.columns} <= existing:
+                index.create(conn, checkfirst=True)
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _product_sku(conn):
+    _add_column(conn, "products", "sku", "VARCHAR")
+    # уникальность sku — через уникальный индекс ix_products_sku
+    _create_indexes(conn)
+
+
+def _archive_tables(conn):
+    for model in (models.ArchivedOrder, models.ArchivedOrderItem):
+        model.__table__.create(conn, checkfirst=True)
+
+
+def _order_item_snapshot(conn):
+    for table in ("order_items", "order_items_archive"):
+        _add_column(conn, table, "product_name", "VARCHAR")
+        _add_column(conn, table, "type_name", "VARCHAR")
+        _add_column(conn, table, "type_image_url", "VARCHAR")
+        # бэкфилл из текущего каталога; у удалённых товаров/типов останется NULL
+        conn.exec_driver_sql(f"""
+            UPDATE {table} SET
+                product_name = (SELECT name FROM products WHERE products.id = {table}.product_id)
+            WHERE product_name IS NULL
+        """)
+        conn.exec_driver_sql(f"""
+            UPDATE {table} SET
+                type_name = (SELECT name FROM product_types WHERE product_types.id = {table}.product_type_id),
+                type_image_url = (SELECT image_url FROM product_types WHERE product_types.id = {table}.product_type_id)
+            WHERE type_name IS NULL AND product_type_id IS NOT NULL
+        """)
+
+
+def _order_updated_at(conn):
+    for table in ("orders", "orders_archive"):
+        _add_column(conn, table, "updated_at", "DATETIME")
+        conn.exec_driver_sql(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL")
+    _create_indexes(conn)
+
+
+def _order_change_seq(conn):
+    for table in ("orders", "orders_archive"):
+        _add_column(conn, table, "change_seq", "INTEGER")
+    # общая нумерация живых и архивных заказов в порядке updated_at
+    conn.exec_driver_sql("""
+        CREATE TEMP TABLE change_seq_backfill AS
+        SELECT src, id, ROW_NUMBER() OVER (ORDER BY updated_at, src, id) AS n
+        FROM (
+            SELECT 'a' AS src, id, updated_at FROM orders_archive
+            UNION ALL
+            SELECT 'o' AS src, id, updated_at FROM orders
+        )
+    """)
+    for table, src in (("orders", "o"), ("orders_archive", "a")):
+        conn.exec_driver_sql(f"""
+            UPDATE {table} SET change_seq = b.n
+            FROM change_seq_backfill AS b
+            WHERE b.src = '{src}' AND b.id = {table}.id AND {table}.change_seq IS NULL
+        """)
+    conn.exec_driver_sql("DROP TABLE change_seq_backfill")
+    # курсор теперь change_seq, индексы по updated_at больше не нужны
+    for index in ("ix_orders_user_id_updated_at", "ix_orders_updated_at", "ix_orders_archive_updated_at"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+    _create_indexes(conn)
+
+
+def _idempotency_keys(conn):
+    models.IdempotencyKey.__table__.create(conn, checkfirst=True)
+
+
+# (версия, функция(conn)) — строго по возрастанию версии; шаги должны быть идемпотентны
+MIGRATIONS = [
+    (1, _baseline),
+    (2, _create_indexes),
+    (3, _product_sku),
+    (4, _archive_tables),
+    (5, _order_item_snapshot),
+    (6, _create_indexes),  # ix_users_name для поиска клиентов
+    (7, _order_updated_at),
+    (8, _create_indexes),  # updated_at для инкрементальной Parquet-выгрузки
+    (9, _idempotency_keys),  # до этого её создавал create_all при каждом migrate()
+    (10, _order_change_seq),
+]
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def migrate(bind=engine) -> int:
+    fresh = not inspect(bind).has_table(models.Order.__tablename__)
+
+    with bind.begin() as conn:
+        if fresh:
+            # пустая БД: сразу актуальная схема, шаги не нужны
+            models.Base.metadata.create_all(bind=conn)
+            version = latest_version()
+        else:
+            version = current_version(conn)
+            for v, step in MIGRATIONS:
+                if v > version:
+                    step(conn)
+                    version = v
+        conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+    return version
+
+
+if __name__ == "__main__":
+    print(f"schema version: {migrate()}")
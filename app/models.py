@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text
 from .database import Base
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 
 
 class User(Base):
@@ -10,7 +10,7 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String, unique=True, index=True)
-    name = Column(String)
+    name = Column(String, index=True)
     car_brand = Column(String)
     hashed_password = Column(String)
     orders_count = Column(Integer, default=0)
@@ -33,9 +33,10 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, unique=True, index=True, nullable=True)  # артикул поставщика, ключ импорта
     name = Column(String, nullable=False)
     price = Column(Float, nullable=False)
-    active = Column(Boolean, default=True)
+    active = Column(Boolean, default=True, index=True)
     discount_percent = Column(Integer, default=0)
     types = relationship("ProductType", back_populates="product", cascade="all, delete-orphan")
 
@@ -49,7 +50,11 @@ class Order(Base):
     discount_percent = Column(Integer)
     final_amount = Column(Float)
     payment_method = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # меняется при approve/reject
+    # номер последнего изменения (создание, approve/reject) — курсор для /orders/changes и
+    # инкрементальной выгрузки; выдаётся в том же INSERT/UPDATE, см. crud.next_change_seq
+    change_seq = Column(Integer, index=True)
     status = Column(String, default="pending")
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
@@ -64,14 +69,17 @@ class Order(Base):
 
     __table_args__ = (
     UniqueConstraint("user_id", "user_order_number", name="uq_user_order_number"),
+    Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+    Index("ix_orders_status_created_at", "status", "created_at"),
+    Index("ix_orders_user_id_change_seq", "user_id", "change_seq"),
     )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
 
     quantity = Column(Integer, default=1)
 
@@ -80,10 +88,79 @@ class OrderItem(Base):
     product_discount_percent = Column(Integer, default=0)       # скидка товара (%)
     price = Column(Float, nullable=False)                       # цена за 1 шт ПОСЛЕ скидки товара
 
+    product_name = Column(String, nullable=True)                # название товара
+    type_name = Column(String, nullable=True)                   # название типа
+    type_image_url = Column(String, nullable=True)              # картинка типа
+
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+    product_type_id = Column(Integer, ForeignKey("product_types.id"), nullable=True, index=True)
+    type = relationship("ProductType")
+
+
+# Архив завершённых заказов (approved/rejected старше ARCHIVE_AFTER_DAYS).
+# Колонки повторяют orders/order_items, id сохраняются исходные.
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    total_amount = Column(Float)
+    discount_percent = Column(Integer)
+    final_amount = Column(Float)
+    payment_method = Column(String)
+    created_at = Column(DateTime, index=True)
+    updated_at = Column(DateTime)
+    change_seq = Column(Integer, index=True)
+    status = Column(String)
+    user_order_number = Column(Integer, nullable=False)
+    user = relationship("User")
+    items = relationship("ArchivedOrderItem", back_populates="order")
+
+    @property
+    def user_name(self):
+        return self.user.name if self.user else None
+
+    @property
+    def user_car(self):
+        return self.user.car_brand if self.user else None
+
+    __table_args__ = (
+    Index("ix_orders_archive_user_id_created_at", "user_id", "created_at"),
+    )
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)
+    original_price = Column(Float, nullable=False)
+    product_discount_percent = Column(Integer)
+    price = Column(Float, nullable=False)
     product_type_id = Column(Integer, ForeignKey("product_types.id"), nullable=True)
+    product_name = Column(String, nullable=True)
+    type_name = Column(String, nullable=True)
+    type_image_url = Column(String, nullable=True)
+
+    order = relationship("ArchivedOrder", back_populates="items")
+    product = relationship("Product")
     type = relationship("ProductType")
 
 
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
 
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)   # sha256 тела запроса
+    order_id = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)         # готовый JSON OrderOut
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+    )
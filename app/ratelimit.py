@@ -0,0 +1,202 @@
+"""Ограничение частоты дорогих запросов (token bucket в памяти процесса).
+
+Маршруты без авторизации (/login, /register) списывают вес из ведра IP
+клиента (RATE_LIMIT_IP_CAPACITY токенов), остальные маршруты из
+ROUTE_COSTS и выгрузки — из ведра пользователя по sub проверенного токена
+(RATE_LIMIT_USER_CAPACITY). Клиенты за одним NAT/прокси не делят лимит
+на заказы и отчёты. Запрос к такому маршруту без валидного токена
+считается по IP (ответит всё равно 401). Вёдра пополняются со скоростью
+RATE_LIMIT_REFILL_PER_SEC; если токенов не хватает — 429 с Retry-After.
+Отчёты дополнительно ограничены числом одновременно выполняемых выгрузок.
+
+IP клиента — адрес TCP-соединения; X-Forwarded-For учитывается, только
+если соединение пришло от прокси из TRUSTED_PROXIES.
+
+Маршруты вне ROUTE_COSTS (каталог, /me и т.п.) проходят без проверок.
+"""
+import ipaddress
+import json
+import math
+import time
+from collections import OrderedDict
+
+from jose import JWTError
+
+from app.config import (
+    RATE_LIMIT_IP_CAPACITY,
+    RATE_LIMIT_USER_CAPACITY,
+    RATE_LIMIT_REFILL_PER_SEC,
+    RATE_LIMIT_MAX_KEYS,
+    REPORT_CONCURRENCY,
+    TRUSTED_PROXIES,
+)
+from app.jwt_utils import decode_token
+
+# (метод, путь) -> вес запроса в токенах
+ROUTE_COSTS = {
+    ("POST", "/login"): 5,
+    ("POST", "/register"): 5,
+    ("POST", "/logout"): 2,
+    ("POST", "/orders"): 2,
+    ("POST", "/admin/products/import"): 10,
+}
+# маршруты без токена — единственные, что считаются по IP
+IP_ROUTES = {("POST", "/login"), ("POST", "/register")}
+
+# выгрузки: вес + общий лимит одновременных запросов
+REPORT_PREFIX = "/admin/reports/"
+REPORT_COST = 10
+
+_TRUSTED_NETWORKS = [
+    ipaddress.ip_network(n.strip(), strict=False) for n in TRUSTED_PROXIES.split(",") if n.strip()
+]
+
+# ключ -> [токены, время последнего пополнения]; самые давние ключи вытесняются
+_buckets: "OrderedDict[str, list[float]]" = OrderedDict()
+_reports_in_flight = 0
+
+stats = {
+    "rejected_rate": 0,
+    "rejected_concurrency": 0,
+    "rejected_by_route": {},
+}
+
+
+def snapshot() -> dict:
+    return {
+        **stats,
+        "rejected_by_route": dict(stats["rejected_by_route"]),
+        "tracked_keys": len(_buckets),
+        "reports_in_flight": _reports_in_flight,
+    }
+
+
+def _capacity(key: str) -> int:
+    return RATE_LIMIT_USER_CAPACITY if key.startswith("user:") else RATE_LIMIT_IP_CAPACITY
+
+
+def _take(key: str, cost: int, now: float) -> float:
+    """Списывает cost токенов; возвращает 0 или сколько секунд ждать."""
+    capacity = _capacity(key)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = [float(capacity), now]
+        _buckets[key] = bucket
+        if len(_buckets) > RATE_LIMIT_MAX_KEYS:
+            _buckets.popitem(last=False)
+    else:
+        _buckets.move_to_end(key)
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * RATE_LIMIT_REFILL_PER_SEC)
+        bucket[1] = now
+
+    if bucket[0] >= cost:
+        bucket[0] -= cost
+        return 0.0
+    return (cost - bucket[0]) / RATE_LIMIT_REFILL_PER_SEC
+
+
+def _refund(key: str, cost: int):
+    bucket = _buckets.get(key)
+    if bucket is not None:
+        bucket[0] = min(_capacity(key), bucket[0] + cost)
+
+
+def _trusted(ip: str) -> bool:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(addr in net for net in _TRUSTED_NETWORKS)
+
+
+def _client_ip(scope) -> str:
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _trusted(peer):
+        return peer
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            # справа налево: первый адрес, добавленный не нашим прокси
+            hops = [h.strip() for h in value.decode("latin-1").split(",")]
+            for hop in reversed(hops):
+                if hop and not _trusted(hop):
+                    return hop
+            break
+    return peer
+
+
+def _user_id(scope) -> str | None:
+    """sub из проверенного bearer-токена (кэш decode_token); мусорные и чужие
+    токены своего ведра не получают."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                sub = decode_token(token.strip()).get("sub")
+            except JWTError:
+                return None
+            return str(sub) if sub is not None else None
+    return None
+
+
+def _key(scope, method: str, path: str) -> str:
+    if (method, path) not in IP_ROUTES:
+        user_id = _user_id(scope)
+        if user_id is not None:
+            return "user:" + user_id
+    return "ip:" + _client_ip(scope)
+
+
+async def _reject(send, route: str, retry_after: float, reason: str):
+    stats[reason] += 1
+    stats["rejected_by_route"][route] = stats["rejected_by_route"].get(route, 0) + 1
+    body = json.dumps({"detail": "Too many requests"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControl:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _reports_in_flight
+
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        method = scope["method"]
+        is_report = path.startswith(REPORT_PREFIX)
+        cost = REPORT_COST if is_report else ROUTE_COSTS.get((method, path))
+        if cost is None:
+            return await self.app(scope, receive, send)
+
+        route = f"{method} {REPORT_PREFIX}*" if is_report else f"{method} {path}"
+        key = _key(scope, method, path)
+        wait = _take(key, cost, time.monotonic())
+        if wait:
+            return await _reject(send, route, wait, "rejected_rate")
+
+        if not is_report:
+            return await self.app(scope, receive, send)
+
+        if _reports_in_flight >= REPORT_CONCURRENCY:
+            _refund(key, cost)
+            return await _reject(send, route, 5, "rejected_concurrency")
+
+        _reports_in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _reports_in_flight -= 1
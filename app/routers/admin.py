@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session, joinedload
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Request
+from sqlalchemy.orm import Session
 from fastapi.responses import StreamingResponse
-import pandas as pd
 from io import BytesIO
 from datetime import datetime
 from app.database import get_db
 from app import crud, schemas, models
 from app.deps import get_current_admin
 from app.cloudinary_client import upload_image
+from app.services import catalog_io, parquet_export
+from app.services.loyalty import reconcile_loyalty
+from app.cache import order_details_cache
+from app import ratelimit
+from app.events import order_events, format_sse
 
 
 router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(get_current_admin)])
@@ -36,6 +41,53 @@ def add_product(
 def list_products(db: Session = Depends(get_db)):
     return crud.admin_get_products(db)   
 
+@router.post("/products/import", response_model=schemas.ProductImportOut)
+def import_products(
+    file: UploadFile = File(...),
+    format: str | None = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        fmt = catalog_io.detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        products, types, errors = catalog_io.parse_catalog(catalog_io.iter_rows(file.file, fmt))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Could not read the file")
+
+    # всё или ничего: при ошибках в строках ничего не пишем
+    if errors:
+        return {"errors": [{"row": n, "error": e} for n, e in errors]}
+
+    return crud.bulk_upsert_products(db, list(products.values()), types)
+
+@router.post("/products/bulk-update")
+def bulk_update_products(payload: schemas.ProductBulkUpdate, db: Session = Depends(get_db)):
+    return {"updated": crud.bulk_update_products(db, payload)}
+
+@router.get("/products/export")
+def export_products(format: str = "csv", db: Session = Depends(get_db)):
+    try:
+        fmt = catalog_io.detect_format(None, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    products = crud.get_catalog_for_export(db)
+    if fmt == "csv":
+        return StreamingResponse(
+            catalog_io.stream_csv(products),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": "attachment; filename=products.csv"},
+        )
+
+    return StreamingResponse(
+        catalog_io.stream_xlsx(products),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": "attachment; filename=products.xlsx"},
+    )
+
 @router.patch("/orders/{order_id}/approve", response_model=schemas.OrderOut)
 def approve_order(order_id: int, db: Session = Depends(get_db)):
     try:
@@ -64,6 +116,8 @@ def export_orders_excel(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
+    import pandas as pd  # тяжёлый импорт только при выгрузке
+
     orders = crud.get_orders_for_report(db, start, end)
 
     # формируем данные
@@ -99,6 +153,31 @@ def export_orders_excel(
             "Content-Disposition": f"attachment; filename={filename}"
         }
     )
+
+@router.get("/reports/parquet")
+def export_orders_parquet(
+    date_from: str | None = None,   # YYYY-MM-DD
+    date_to: str | None = None,     # YYYY-MM-DD, включительно
+    since: int | None = None,       # X-Change-Seq прошлой выгрузки: только заказы, созданные или изменённые после неё
+    db: Session = Depends(get_db)
+):
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) if date_to else None
+        if end and len(date_to) == 10:
+            end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    # верхняя граница фиксируется до начала выгрузки: изменения после неё попадут в следующую
+    until = crud.current_change_seq(db)
+    filename = f"orders_{date_from or 'all'}_to_{date_to or 'now'}.parquet"
+    return StreamingResponse(
+        parquet_export.stream_orders_parquet(db, start, end, since, until),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f"attachment; filename={filename}", "X-Change-Seq": str(until)}
+    )
+
 @router.get("/reports/client/{user_id}/excel")
 def export_client_report_excel(
     user_id: int,
@@ -121,15 +200,17 @@ def export_client_report_excel(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    import pandas as pd  # тяжёлый импорт только при выгрузке
+
     orders = crud.get_client_orders_with_items(db, user_id, start, end)
 
     # 1) Таблица "Покупки" (строка = товар в заказе)
     rows = []
     for o in orders:
         for it in o.items:
-            product_name = it.product.name if it.product else f"product_id={it.product_id}"
+            product_name = it.product_name or f"product_id={it.product_id}"
             line_total = float(it.price) * int(it.quantity)
-            type_name = it.type.name if getattr(it, "type", None) else "—"
+            type_name = it.type_name or "—"
 
             rows.append({
                 "Дата": o.created_at.strftime("%d.%m.%Y"),
@@ -197,6 +278,15 @@ def update_product(
 ):
     return crud.update_product(db, product_id, payload)
 
+@router.get("/users", response_model=schemas.CustomersPageOut)
+def list_customers(
+    cursor: int | None = None,
+    limit: int = 50,
+    q: str | None = None,
+    db: Session = Depends(get_db),
+):
+    return crud.admin_get_customers(db, cursor=cursor, limit=limit, q=q)
+
 @router.patch("/users/make-admin", response_model=schemas.UserOut)
 def make_admin(
     payload: schemas.MakeAdminRequest,
@@ -207,6 +297,10 @@ def make_admin(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.post("/loyalty/reconcile")
+def loyalty_reconcile(dry_run: bool = False, db: Session = Depends(get_db)):
+    return reconcile_loyalty(db, dry_run=dry_run)
+
 @router.get("/orders", response_model=schemas.OrdersPageOut)
 def list_orders(
     page: int = 1,
@@ -217,25 +311,15 @@ def list_orders(
 ):
     return crud.admin_get_orders(db, page=page, limit=limit, q=q, status=status)
 
+@router.get("/ratelimit/stats")
+def ratelimit_stats():
+    return ratelimit.snapshot()
+
 @router.get("/orders/count")
 def orders_count(db: Session = Depends(get_db)):
     return {"total": crud.admin_orders_count(db)}
 
-@router.get("/orders/{order_id}")
-def get_order_details(order_id: int, db: Session = Depends(get_db)):
-    o = (
-        db.query(models.Order)
-        .options(
-        joinedload(models.Order.user), 
-        joinedload(models.Order.items).joinedload(models.OrderItem.product), 
-        joinedload(models.Order.items).joinedload(models.OrderItem.type),
-        )
-        .filter(models.Order.id == order_id)
-        .first()
-    )
-    if not o:
-        raise HTTPException(status_code=404, detail="Order not found")
-
+def _order_details(o):
     return {
         "id": o.id,
         "user_id": o.user_id,
@@ -250,7 +334,7 @@ def get_order_details(order_id: int, db: Session = Depends(get_db)):
             {
                 "id": it.id,
                 "product_id": it.product_id,
-                "product_name": it.product.name if it.product else "—",
+                "product_name": it.product_name or "—",
                 "quantity": it.quantity,
                 "original_price": float(getattr(it, "original_price", it.price)),  # на всякий
                 "price": float(it.price),
@@ -259,18 +343,109 @@ def get_order_details(order_id: int, db: Session = Depends(get_db)):
                 "product_type_id": it.product_type_id,
                 "type": (
                     {
-                        "id": it.type.id,
-                        "product_id": it.type.product_id,
-                        "name": it.type.name,
-                        "image_url": it.type.image_url,
+                        "id": it.product_type_id,
+                        "product_id": it.product_id,
+                        "name": it.type_name,
+                        "image_url": it.type_image_url,
                     }
-                    if it.type else None
+                    if it.product_type_id is not None else None
                 ),
             }
             for it in o.items
         ],
     }
 
+def _orders_details(db: Session, ids: list[int]) -> dict[int, dict]:
+    result = {}
+    missing = []
+    cached = {}
+    for order_id in ids:
+        hit = order_details_cache.get(order_id)
+        if hit is not None:
+            cached[order_id] = hit
+        else:
+            missing.append(order_id)
+
+    if cached:
+        # approve/reject на другом воркере этот кэш не сбросит — сверяем change_seq
+        # по первичному ключу; архивных заказов в orders нет, но они и не меняются
+        current = crud.get_order_change_seqs(db, list(cached))
+        for order_id, (change_seq, details) in cached.items():
+            if order_id in current and current[order_id] != change_seq:
+                missing.append(order_id)
+            else:
+                result[order_id] = details
+
+    for o in crud.get_orders_with_details(db, missing):
+        details = _order_details(o)
+        order_details_cache.set(o.id, (o.change_seq, details))
+        result[o.id] = details
+    return result
+
+SSE_KEEPALIVE_SECONDS = 15
+
+@router.get("/orders/stream")
+async def orders_stream(
+    request: Request,
+    last_event_id: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    # сессия нужна только для проверки админа — не держим соединение из пула всё время стрима
+    db.close()
+
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    queue, backlog, gap = order_events.subscribe(last_id)
+
+    async def events():
+        try:
+            if gap:
+                # часть событий потеряна — клиент перечитывает /admin/orders
+                yield "event: reset\ndata: {}\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            order_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+MAX_DETAILS_BATCH = 100
+
+@router.get("/orders/details")
+def get_orders_details(ids: str, db: Session = Depends(get_db)):
+    try:
+        order_ids = list(dict.fromkeys(int(x) for x in ids.split(",") if x.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(order_ids) > MAX_DETAILS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DETAILS_BATCH} ids per request")
+
+    found = _orders_details(db, order_ids)
+    return {
+        "orders": {str(i): found[i] for i in order_ids if i in found},
+        "missing": [i for i in order_ids if i not in found],
+    }
+
+@router.get("/orders/{order_id}")
+def get_order_details(order_id: int, db: Session = Depends(get_db)):
+    found = _orders_details(db, [order_id])
+    if order_id not in found:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return found[order_id]
+
 @router.post("/products/{product_id}/types", response_model=schemas.ProductTypeOut)
 def add_product_type(
     product_id: int,
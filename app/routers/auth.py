@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import JWTError
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app import models, schemas, crud
 from app.auth import verify_password
-from app.jwt_utils import create_access_token
+from app.jwt_utils import create_access_token, revoke_token
+from app.deps import oauth2_scheme
 
 router = APIRouter(tags=["Auth"])
 
@@ -37,3 +39,18 @@ def login(
         "access_token": token,
         "token_type": "bearer",
     }
+
+@router.post("/logout")
+def logout(token: str = Depends(oauth2_scheme)):
+    """Токен перестаёт приниматься только тем воркером, который обработал
+    logout: список отзыва живёт в памяти процесса. При нескольких воркерах
+    остальные принимают токен до его exp — это не полноценный отзыв."""
+    try:
+        revoke_token(token)
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid auth credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {"ok": True}
@@ -1,25 +1,140 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.deps import get_current_user
 from app.database import get_db
-from app import schemas, crud, models
+from app import schemas, crud, models, idempotency
+from app.events import order_events
 
 router = APIRouter(tags=["Orders"])
 
+_summary_list = TypeAdapter(list[schemas.OrderSummaryOut])
+_with_products_list = TypeAdapter(list[schemas.OrderWithProductsOut])
+
+def _json(body: bytes | str) -> Response:
+    return Response(content=body, media_type="application/json")
+
 @router.post("/orders", response_model=schemas.OrderOut)
 def create_order(
     order: schemas.OrderCreate,
+    view: schemas.OrderView = "full",
+    idempotency_key: str | None = Header(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.create_order(db, current_user, order)
+    if not idempotency_key:
+        created = crud.create_order(db, current_user, order)
+        if view == "summary":
+            return _json(schemas.OrderSummaryOut.model_validate(created).model_dump_json())
+        return created
+
+    req_hash = idempotency.request_hash(order)
+    with idempotency.key_lock(current_user.id, idempotency_key):
+        try:
+            cached = idempotency.get_response(db, current_user.id, idempotency_key, req_hash)
+            if cached is None:
+                try:
+                    created = crud.create_order(
+                        db, current_user, order,
+                        idempotency_key=idempotency_key, request_hash=req_hash,
+                    )
+                    if view == "summary":
+                        return _json(schemas.OrderSummaryOut.model_validate(created).model_dump_json())
+                    return created
+                except IntegrityError:
+                    # тот же ключ успел записать другой процесс
+                    db.rollback()
+                    cached = idempotency.get_response(db, current_user.id, idempotency_key, req_hash)
+                    if cached is None:
+                        raise
+        except idempotency.IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    if view == "summary":
+        # сохранён полный ответ — сужаем его до summary
+        full = schemas.OrderOut.model_validate_json(cached)
+        return _json(schemas.OrderSummaryOut.model_validate(full, from_attributes=True).model_dump_json())
+    return _json(cached)
 
 @router.get("/orders", response_model=list[schemas.OrderOut])
 def my_orders(
+    view: schemas.OrderView = "full",
+    # устарело: вложенные product/type из текущего каталога; вместо них — поля-снимки позиции
+    include_product: bool = Query(False, deprecated=True),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.get_user_orders(db, current_user.id)
+    if include_product and view == "full":
+        orders = crud.get_user_orders(db, current_user.id, view="with_product")
+        return _json(_with_products_list.dump_json(_with_products_list.validate_python(orders, from_attributes=True)))
+
+    orders = crud.get_user_orders(db, current_user.id, view=view)
+    if view == "summary":
+        return _json(_summary_list.dump_json(_summary_list.validate_python(orders, from_attributes=True)))
+    return orders
+
+MAX_CHANGES_WAIT = 30  # секунд
+CHANGES_PAGE = 100
+
+@router.get("/orders/changes", response_model=schemas.OrderChangesOut)
+async def order_changes(
+    since: int | None = Query(None, ge=0),  # cursor из предыдущего ответа
+    wait: int = Query(0, ge=0, le=MAX_CHANGES_WAIT),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Заказы клиента, изменённые после курсора since (создание, approve/reject).
+    Курсор — change_seq, который выдаётся при записи, а не часы воркера.
+
+    Пустой ответ возвращает тот же курсор. С wait > 0 запрос ждёт изменения до
+    wait секунд. События приходят из шины этого процесса; изменение, сделанное
+    другим воркером, подхватится повторным запросом по истечении wait.
+    """
+    user_id = current_user.id
+
+    def fetch() -> tuple[bytes, bool]:
+        try:
+            orders = crud.get_user_order_changes(db, user_id, since, limit=CHANGES_PAGE)
+            cursor = orders[-1].change_seq if orders else since
+            page = schemas.OrderChangesOut(
+                orders=_summary_list.validate_python(orders, from_attributes=True),
+                cursor=cursor,
+            )
+            return page.model_dump_json().encode(), bool(orders)
+        finally:
+            # отдаём соединение в пул, пока ждём событий
+            db.rollback()
+
+    if not wait:
+        body, _ = await run_in_threadpool(fetch)
+        return _json(body)
+
+    # подписка до первого запроса, чтобы не пропустить изменение между ними
+    queue, _, _ = order_events.subscribe()
+    try:
+        body, changed = await run_in_threadpool(fetch)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while not changed:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            if event["data"].get("user_id") == user_id:
+                body, changed = await run_in_threadpool(fetch)
+    finally:
+        order_events.unsubscribe(queue)
+
+    if not changed:
+        # событие могло прийти с другого воркера — последний дешёвый запрос по индексу
+        body, _ = await run_in_threadpool(fetch)
+    return _json(body)
 
 @router.get("/products", response_model=list[schemas.ProductOut])
 def list_products(db: Session = Depends(get_db)):
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Literal
 from typing import List
 
 class UserCreate(BaseModel):
@@ -24,6 +24,7 @@ class UserOut(BaseModel):
         orm_mode = True
 
 class ProductBase(BaseModel):
+    sku: str | None = None
     name: str
     price: float
     discount_percent: int = 0
@@ -65,12 +66,19 @@ class OrderItemOut(BaseModel):
     product_discount_percent: int
     price: float  # after product discount'
     product_type_id: int | None = None
-    product: ProductOut
-    type: ProductTypeOut | None = None
+    product_name: str | None = None
+    type_name: str | None = None
+    type_image_url: str | None = None
 
     class Config:
         from_attributes = True
 
+class OrderItemWithProductOut(OrderItemOut):
+    # устарело: текущие карточки товара/типа из каталога (GET /orders?include_product=true);
+    # для истории заказа есть поля-снимки product_name/type_name/type_image_url
+    product: ProductOut | None = None
+    type: ProductTypeOut | None = None
+
 class OrderOut(BaseModel):
     id: int
     user_id: int
@@ -82,18 +90,91 @@ class OrderOut(BaseModel):
     payment_method: str
     status: str
     created_at: datetime
+    updated_at: datetime | None = None
     user_order_number: int
     items: list[OrderItemOut] = [] 
 
     class Config:
         from_attributes = True
 
+class OrderWithProductsOut(OrderOut):
+    items: list[OrderItemWithProductOut] = []
+
+# view=summary: без вложенных товаров/типов и данных клиента
+OrderView = Literal["summary", "full"]
+
+class OrderItemSummaryOut(BaseModel):
+    id: int
+    product_id: int
+    product_type_id: int | None = None
+    product_name: str | None = None
+    type_name: str | None = None
+    quantity: int
+    price: float
+
+    class Config:
+        from_attributes = True
+
+class OrderSummaryOut(BaseModel):
+    id: int
+    user_order_number: int
+    status: str
+    payment_method: str
+    total_amount: float
+    discount_percent: int
+    final_amount: float
+    created_at: datetime
+    updated_at: datetime | None = None
+    items: list[OrderItemSummaryOut] = []
+
+    class Config:
+        from_attributes = True
+
+class OrderChangesOut(BaseModel):
+    orders: list[OrderSummaryOut]
+    cursor: int | None = None  # передать как since в следующий запрос
+
 class ProductUpdate(BaseModel):
+    sku: Optional[str] = None
     name: Optional[str] = None
     price: Optional[float] = None
     discount_percent: Optional[int] = None
     active: Optional[bool] = None
 
+class ProductBulkFilter(BaseModel):
+    # пустой фильтр = весь каталог
+    ids: list[int] | None = None
+    name_like: str | None = None  # шаблон LIKE без учёта регистра (и для кириллицы), например "%коврик%"
+    active: bool | None = None
+
+class ProductBulkUpdate(BaseModel):
+    filter: ProductBulkFilter = ProductBulkFilter()
+    set_discount_percent: int | None = Field(None, ge=0, le=100)
+    adjust_discount_percent: int | None = None   # +5 / -5, результат зажимается в 0..100
+    scale_price_percent: float | None = Field(None, gt=-100)  # +10 = цена * 1.10
+    set_active: bool | None = None
+
+    @model_validator(mode="after")
+    def check_operations(self):
+        if self.set_discount_percent is not None and self.adjust_discount_percent is not None:
+            raise ValueError("Use either set_discount_percent or adjust_discount_percent")
+        if all(v is None for v in (
+            self.set_discount_percent, self.adjust_discount_percent,
+            self.scale_price_percent, self.set_active,
+        )):
+            raise ValueError("No update operation given")
+        return self
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+class ProductImportOut(BaseModel):
+    created: int = 0
+    updated: int = 0
+    types: int = 0
+    errors: list[ProductImportError] = []
+
 class MakeAdminRequest(BaseModel):
     user_id: int
 
@@ -109,6 +190,23 @@ class MeOut(BaseModel):
     class Config:
         from_attributes = True
 
+class CustomerOut(BaseModel):
+    id: int
+    phone: str
+    name: str
+    car_brand: str | None = None
+    is_admin: bool = False
+    discount: int
+    orders_count: int            # подтверждённые заказы (счётчик лояльности)
+    total_orders: int = 0        # все заказы, включая архив
+    approved_orders: int = 0
+    lifetime_spend: float = 0    # сумма final_amount подтверждённых заказов
+    last_order_at: datetime | None = None
+
+class CustomersPageOut(BaseModel):
+    items: list[CustomerOut]
+    next_cursor: int | None = None
+
 class OrderAdminOut(OrderOut):
     user_name: str
 
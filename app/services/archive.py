@@ -0,0 +1,84 @@
+"""Перенос завершённых заказов в архивные таблицы.
+
+    python -m app.services.archive [--days 365] [--batch 500]
+
+Живые orders/order_items остаются маленькими; отчёты и история клиента
+подмешивают архив сами (см. crud).
+"""
+from dotenv import load_dotenv
+load_dotenv()
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import ARCHIVE_AFTER_DAYS
+
+FINISHED_STATUSES = ("approved", "rejected")
+
+
+def _copy(db: Session, src, dst, where):
+    cols = [c.name for c in src.__table__.columns]
+    db.execute(
+        insert(dst.__table__).from_select(
+            cols, select(*[src.__table__.c[c] for c in cols]).where(where)
+        )
+    )
+
+
+def archive_orders(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 500) -> int:
+    """Переносит approved/rejected заказы старше older_than_days пачками,
+    каждая пачка — отдельная транзакция. Возвращает число перенесённых заказов."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    # самый новый заказ никогда не трогаем: SQLite без AUTOINCREMENT выдаёт
+    # следующий id как max(id) + 1, и удаление последней строки вернуло бы её id в оборот
+    max_id = db.scalar(select(func.max(models.Order.id)))
+    if max_id is None:
+        return 0
+
+    moved = 0
+    while True:
+        ids = db.scalars(
+            select(models.Order.id)
+            .where(
+                models.Order.status.in_(FINISHED_STATUSES),
+                models.Order.created_at < cutoff,
+                models.Order.id < max_id,
+            )
+            .order_by(models.Order.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        try:
+            _copy(db, models.Order, models.ArchivedOrder, models.Order.id.in_(ids))
+            _copy(db, models.OrderItem, models.ArchivedOrderItem, models.OrderItem.order_id.in_(ids))
+            db.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(ids)))
+            db.execute(delete(models.Order).where(models.Order.id.in_(ids)))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        moved += len(ids)
+
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"archived orders: {archive_orders(db, args.days, args.batch)}")
+    finally:
+        db.close()
@@ -0,0 +1,155 @@
+import csv
+import io
+import tempfile
+
+# колонки файла импорта/экспорта каталога; одна строка = товар + (необязательно) один его тип
+COLUMNS = ["sku", "name", "price", "discount_percent", "active", "type_name", "type_image_url"]
+
+CHUNK_SIZE = 64 * 1024
+XLSX_SPOOL_MAX = 8 * 1024 * 1024  # больше — файл уходит из памяти на диск
+
+_TRUE = {"1", "true", "yes", "да", "y"}
+_FALSE = {"0", "false", "no", "нет", "n"}
+
+
+def detect_format(filename: str | None, fmt: str | None = None) -> str:
+    fmt = (fmt or (filename or "").rsplit(".", 1)[-1]).lower()
+    if fmt not in ("csv", "xlsx"):
+        raise ValueError("Unsupported file format. Use .csv or .xlsx")
+    return fmt
+
+
+def iter_rows(fileobj, fmt: str):
+    """Построчно отдаёт dict по колонкам заголовка, не читая файл целиком."""
+    if fmt == "csv":
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        for row in csv.DictReader(text):
+            yield {(k or "").strip().lower(): v for k, v in row.items()}
+        text.detach()
+        return
+
+    from openpyxl import load_workbook  # тяжёлый импорт только при импорте xlsx
+
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h or "").strip().lower() for h in next(rows, [])]
+        for values in rows:
+            if all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _bool(value, default: bool) -> bool:
+    if isinstance(value, bool):
+        return value
+    v = _text(value).lower()
+    if not v:
+        return default
+    if v in _TRUE:
+        return True
+    if v in _FALSE:
+        return False
+    raise ValueError(f"active: expected true/false, got {v!r}")
+
+
+def parse_catalog(rows):
+    """Проверяет все строки заранее.
+
+    Возвращает (products, types, errors): products — dict по sku (первая строка
+    артикула задаёт товар, следующие строки того же sku добавляют только типы),
+    types — список (sku, name, image_url), errors — [(номер строки, текст)].
+    Номера строк считаются как в файле, с учётом заголовка.
+    """
+    products, types, errors = {}, [], []
+
+    for n, row in enumerate(rows, start=2):
+        try:
+            sku = _text(row.get("sku"))
+            if not sku:
+                raise ValueError("sku is required")
+
+            if sku not in products:
+                name = _text(row.get("name"))
+                if not name:
+                    raise ValueError("name is required")
+                try:
+                    price = float(_text(row.get("price")).replace(",", "."))
+                except ValueError:
+                    raise ValueError(f"price: expected a number, got {row.get('price')!r}")
+                if price < 0:
+                    raise ValueError("price must be >= 0")
+                disc_raw = _text(row.get("discount_percent")) or "0"
+                try:
+                    discount = int(float(disc_raw))
+                except ValueError:
+                    raise ValueError(f"discount_percent: expected an integer, got {disc_raw!r}")
+                if not 0 <= discount <= 100:
+                    raise ValueError("discount_percent must be between 0 and 100")
+
+                products[sku] = {
+                    "sku": sku,
+                    "name": name,
+                    "price": price,
+                    "discount_percent": discount,
+                    "active": _bool(row.get("active"), True),
+                }
+
+            type_name = _text(row.get("type_name"))
+            type_image = _text(row.get("type_image_url"))
+            if type_name:
+                if not type_image:
+                    raise ValueError("type_image_url is required when type_name is set")
+                types.append((sku, type_name, type_image))
+            elif type_image:
+                raise ValueError("type_name is required when type_image_url is set")
+        except ValueError as e:
+            errors.append((n, str(e)))
+
+    return products, types, errors
+
+
+def catalog_rows(products):
+    for p in products:
+        base = [p.sku or "", p.name, p.price, p.discount_percent or 0, bool(p.active)]
+        if not p.types:
+            yield base + ["", ""]
+        for t in p.types:
+            yield base + [t.name, t.image_url]
+
+
+def stream_csv(products):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for row in catalog_rows(products):
+        writer.writerow(row)
+        if buf.tell() > CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_xlsx(products):
+    """xlsx — zip, собирается только целиком при save(), поэтому книга пишется
+    во временный файл (до XLSX_SPOOL_MAX в памяти) и отдаётся кусками."""
+    from openpyxl import Workbook  # тяжёлый импорт только при экспорте xlsx
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Products")
+    ws.append(COLUMNS)
+    for row in catalog_rows(products):
+        ws.append(row)
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX) as output:
+        wb.save(output)
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
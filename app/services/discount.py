@@ -1,11 +1,15 @@
+# (заказов не больше, скидка %); всё, что выше последней ступени, — MAX_DISCOUNT
+DISCOUNT_TIERS = [
+    (1, 3),
+    (2, 4),
+    (3, 5),
+    (4, 7),
+]
+MAX_DISCOUNT = 10
+
+
 def calculate_discount(orders_count: int) -> int:
-    if orders_count <= 1:
-        return 3
-    if orders_count == 2:
-        return 4
-    if orders_count == 3:
-        return 5
-    if orders_count == 4:
-        return 7
-    else:
-        return 10
+    for max_orders, discount in DISCOUNT_TIERS:
+        if orders_count <= max_orders:
+            return discount
+    return MAX_DISCOUNT
@@ -0,0 +1,128 @@
+"""Пересчёт User.orders_count и User.discount по фактическим заказам.
+
+    python -m app.services.loyalty [--dry-run]
+
+Один GROUP BY по подтверждённым заказам (живым и архивным) во временную
+таблицу расхождений, затем один UPDATE ... FROM по ней.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+from sqlalchemy import (
+    Table, Column, Integer, MetaData,
+    select, insert, update, func, case, or_, union_all,
+)
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.discount import DISCOUNT_TIERS, MAX_DISCOUNT
+
+SAMPLE_SIZE = 20
+
+_drift = Table(
+    "loyalty_drift",
+    MetaData(),
+    Column("user_id", Integer, primary_key=True),
+    Column("old_count", Integer),
+    Column("old_discount", Integer),
+    Column("new_count", Integer),
+    Column("new_discount", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+
+def discount_case(orders_count):
+    """SQL-версия calculate_discount по тем же ступеням."""
+    return case(
+        *[(orders_count <= max_orders, discount) for max_orders, discount in DISCOUNT_TIERS],
+        else_=MAX_DISCOUNT,
+    )
+
+
+def _drift_select():
+    approved = union_all(
+        select(models.Order.user_id).where(models.Order.status == "approved"),
+        select(models.ArchivedOrder.user_id).where(models.ArchivedOrder.status == "approved"),
+    ).subquery()
+    counts = (
+        select(approved.c.user_id, func.count().label("cnt"))
+        .group_by(approved.c.user_id)
+        .subquery()
+    )
+    new_count = func.coalesce(counts.c.cnt, 0)
+    new_discount = discount_case(new_count)
+    return (
+        select(
+            models.User.id,
+            models.User.orders_count,
+            models.User.discount,
+            new_count,
+            new_discount,
+        )
+        .outerjoin(counts, counts.c.user_id == models.User.id)
+        .where(or_(
+            func.coalesce(models.User.orders_count, -1) != new_count,
+            func.coalesce(models.User.discount, -1) != new_discount,
+        ))
+    )
+
+
+def reconcile_loyalty(db: Session, dry_run: bool = False) -> dict:
+    conn = db.connection()
+    _drift.drop(conn, checkfirst=True)
+    _drift.create(conn)
+    try:
+        db.execute(insert(_drift).from_select(
+            ["user_id", "old_count", "old_discount", "new_count", "new_discount"],
+            _drift_select(),
+        ))
+
+        summary = db.execute(select(
+            func.count(),
+            func.coalesce(func.sum(case((func.coalesce(_drift.c.old_count, -1) != _drift.c.new_count, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((func.coalesce(_drift.c.old_discount, -1) != _drift.c.new_discount, 1), else_=0)), 0),
+        )).one()
+        sample = db.execute(select(_drift).order_by(_drift.c.user_id).limit(SAMPLE_SIZE)).mappings().all()
+
+        updated = 0
+        if not dry_run and summary[0]:
+            updated = db.execute(
+                update(models.User)
+                .where(models.User.id == _drift.c.user_id)
+                .values(orders_count=_drift.c.new_count, discount=_drift.c.new_discount),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+
+        _drift.drop(db.connection())
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "users_with_drift": summary[0],
+        "orders_count_drift": summary[1],
+        "discount_drift": summary[2],
+        "updated": updated,
+        "dry_run": dry_run,
+        "sample": [dict(r) for r in sample],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(json.dumps(reconcile_loyalty(db, dry_run=args.dry_run), ensure_ascii=False, indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,134 @@
+"""Выгрузка заказов с позициями в Parquet для аналитики.
+
+Строка = позиция заказа с полями заказа и снимком товара/типа. Пишем пачками
+(record batch -> row group) и отдаём байты по мере записи, не собирая
+файл целиком в памяти.
+
+Инкрементальная выгрузка: since — change_seq из заголовка X-Change-Seq
+прошлой выгрузки; берутся заказы, созданные или изменённые (approve/reject)
+после него и не позже until. Заказ, выгруженный как pending, придёт ещё раз
+с новым статусом: строки дедуплицируются по item_id с наибольшим change_seq.
+"""
+import io
+from datetime import datetime
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app import models, crud
+
+BATCH_ROWS = 10_000
+
+
+def _schema(pa):
+    label = pa.dictionary(pa.int8(), pa.string())  # несколько повторяющихся значений
+    return pa.schema([
+        ("order_id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("user_order_number", pa.int32()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+        ("change_seq", pa.int64()),
+        ("status", label),
+        ("payment_method", label),
+        ("order_total_amount", pa.float64()),
+        ("order_discount_percent", pa.int32()),
+        ("order_final_amount", pa.float64()),
+        ("item_id", pa.int64()),
+        ("product_id", pa.int64()),
+        ("product_name", pa.string()),
+        ("product_type_id", pa.int64()),
+        ("type_name", pa.string()),
+        ("quantity", pa.int32()),
+        ("original_price", pa.float64()),
+        ("product_discount_percent", pa.int32()),
+        ("price", pa.float64()),
+        ("line_total", pa.float64()),
+    ])
+
+
+def _select(order_model, item_model, date_from, date_to, since, until):
+    o, it = order_model, item_model
+    stmt = (
+        select(
+            o.id, o.user_id, o.user_order_number, o.created_at, o.updated_at, o.change_seq, o.status, o.payment_method,
+            o.total_amount, o.discount_percent, o.final_amount,
+            it.id, it.product_id, it.product_name, it.product_type_id, it.type_name,
+            it.quantity, it.original_price, it.product_discount_percent, it.price,
+            it.price * it.quantity,
+        )
+        .join(it, it.order_id == o.id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(o.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(o.created_at <= date_to)
+    if since is not None:
+        stmt = stmt.where(o.change_seq > since)
+    if until is not None:
+        stmt = stmt.where(o.change_seq <= until)
+    return stmt
+
+
+def _archive_needed(db: Session, date_from, since) -> bool:
+    if not crud.archive_needed(db, date_from):
+        return False
+    if since is None:
+        return True
+    newest = db.scalar(select(func.max(models.ArchivedOrder.change_seq)))
+    return newest is not None and newest > since
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файлоподобный приёмник: копит записанные байты до следующего yield."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_orders_parquet(
+    db: Session,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    since: int | None = None,
+    until: int | None = None,
+):
+    import pyarrow as pa  # тяжёлый импорт только при выгрузке
+    import pyarrow.parquet as pq
+
+    schema = _schema(pa)
+    sources = [(models.Order, models.OrderItem)]
+    if _archive_needed(db, date_from, since):
+        sources.append((models.ArchivedOrder, models.ArchivedOrderItem))
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for order_model, item_model in sources:
+            stmt = _select(order_model, item_model, date_from, date_to, since, until)
+            result = db.execute(stmt.execution_options(yield_per=BATCH_ROWS))
+            for rows in result.partitions():
+                columns = list(zip(*rows))
+                batch = pa.RecordBatch.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                    schema=schema,
+                )
+                writer.write_batch(batch)
+                chunk = sink.take()
+                if chunk:
+                    yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,42 @@
+"""Накладные расходы авторизации на запрос: проверка JWT с кэшем и без.
+
+    python scripts/bench_auth.py [-n 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jose import jwt  # noqa: E402
+
+from app import jwt_utils  # noqa: E402
+from app.config import SECRET_KEY, ALGORITHM  # noqa: E402
+
+
+def bench(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = jwt_utils.create_access_token({"sub": "42", "is_admin": False})
+
+    uncached = bench(lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), args.n)
+    jwt_utils.decode_token(token)  # прогрев кэша
+    cached = bench(lambda: jwt_utils.decode_token(token), args.n)
+
+    print(f"python-jose decode (no cache): {uncached:8.1f} us/request")
+    print(f"decode_token (cache hit):      {cached:8.1f} us/request")
+    print(f"speedup: x{uncached / cached:.0f}")
+
+
+if __name__ == "__main__":
+    main()
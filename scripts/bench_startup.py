@@ -0,0 +1,59 @@
+"""Время импорта модулей при холодном старте воркера.
+
+    python scripts/bench_startup.py                 # app.main
+    python scripts/bench_startup.py app.routers.public --top 30
+
+Запускает чистый интерпретатор с `-X importtime` и печатает
+суммарное время импорта по модулям, самые тяжёлые сверху.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return wall, rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    wall, rows = measure(args.module)
+
+    print(f"{args.module}: {wall * 1000:.0f} ms wall (incl. interpreter start)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    heavy = [n.strip() for n, _, _ in rows if n.strip() in ("pandas", "numpy", "openpyxl", "cloudinary")]
+    if heavy:
+        print("heavy modules imported at startup: " + ", ".join(heavy))
+
+
+if __name__ == "__main__":
+    main()
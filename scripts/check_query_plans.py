@@ -0,0 +1,214 @@
+"""Проверка планов запросов crud.py / routers/admin.py.
+
+    python scripts/check_query_plans.py [--users 2000] [-v]
+
+Создаёт временную БД через миграции, наполняет её данными, вызывает
+каждую функцию из CASES и прогоняет все выполненные ею SELECT/UPDATE/DELETE
+через EXPLAIN QUERY PLAN. Если горячий запрос читает большую таблицу
+полным SCAN (в том числе по покрывающему индексу), скрипт завершается с кодом 1.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "plans.db")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import crud, models, schemas  # noqa: E402
+from app.cache import order_details_cache  # noqa: E402
+from app.database import engine, SessionLocal  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+from app.routers import admin  # noqa: E402
+from app.services import parquet_export  # noqa: E402
+from app.services.archive import archive_orders  # noqa: E402
+from app.services.loyalty import reconcile_loyalty  # noqa: E402
+
+BIG_TABLES = {"users", "orders", "order_items", "orders_archive", "order_items_archive"}
+
+NOW = datetime(2026, 1, 1)
+
+
+def seed(db, n_users: int):
+    rnd = random.Random(42)
+    db.execute(models.Product.__table__.insert(), [
+        {"name": f"product {i}", "price": 1000 + i, "active": i % 5 != 0, "discount_percent": 0}
+        for i in range(1, 201)
+    ])
+    db.execute(models.ProductType.__table__.insert(), [
+        {"product_id": i, "name": "black", "image_url": "http://img/black.png"}
+        for i in range(1, 201)
+    ])
+    db.execute(models.User.__table__.insert(), [
+        {"phone": f"7700{i:07d}", "name": f"user {i}", "car_brand": "Toyota",
+         "hashed_password": "x", "orders_count": 0, "discount": 3, "is_admin": False}
+        for i in range(1, n_users + 1)
+    ])
+
+    orders, items = [], []
+    order_id = 0
+    for user_id in range(1, n_users + 1):
+        for num in range(1, rnd.randint(1, 15) + 1):
+            order_id += 1
+            orders.append({
+                "id": order_id, "user_id": user_id, "user_order_number": num,
+                "total_amount": 1000, "discount_percent": 3, "final_amount": 970,
+                "payment_method": "cash",
+                "status": rnd.choice(["pending", "approved", "approved", "approved", "rejected"]),
+                "created_at": NOW - timedelta(minutes=rnd.randint(0, 60 * 24 * 1000)),
+                "change_seq": order_id,
+            })
+            for _ in range(rnd.randint(1, 3)):
+                product_id = rnd.randint(1, 200)
+                items.append({
+                    "order_id": order_id, "product_id": product_id, "product_type_id": product_id,
+                    "quantity": 1, "original_price": 1000, "product_discount_percent": 0, "price": 1000,
+                })
+    db.execute(models.Order.__table__.insert(), orders)
+    db.execute(models.OrderItem.__table__.insert(), items)
+    db.commit()
+    archive_orders(db, older_than_days=365)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _pending_order_id(db) -> int:
+    return db.query(models.Order.id).filter(models.Order.status == "pending").first()[0]
+
+
+# (название, функция(db), большие таблицы, которые этому запросу можно сканировать и почему)
+CASES = [
+    ("get_user_by_phone", lambda db: crud.get_user_by_phone(db, "77000000042"), {}),
+    ("get_active_products", lambda db: crud.get_active_products(db), {}),
+    ("admin_get_products", lambda db: crud.admin_get_products(db), {}),
+    ("get_products", lambda db: crud.get_products(db), {}),
+    ("get_user_orders", lambda db: crud.get_user_orders(db, 42), {}),
+    ("get_user_order_changes", lambda db: crud.get_user_order_changes(db, 42), {}),
+    ("get_user_order_changes(since)", lambda db: crud.get_user_order_changes(db, 42, 1000), {}),
+    ("stream_orders_parquet(since)", lambda db: list(parquet_export.stream_orders_parquet(
+        db, since=crud.current_change_seq(db) - 100)), {}),
+    ("get_orders_for_report", lambda db: crud.get_orders_for_report(
+        db, NOW - timedelta(days=3), NOW), {}),
+    ("get_orders_for_report(archive)", lambda db: crud.get_orders_for_report(
+        db, NOW - timedelta(days=900), NOW - timedelta(days=897)), {}),
+    ("get_client_orders_with_items", lambda db: crud.get_client_orders_with_items(
+        db, 42, NOW - timedelta(days=365), NOW), {}),
+    ("get_client_orders_with_items(archive)", lambda db: crud.get_client_orders_with_items(
+        db, 42, NOW - timedelta(days=1000), NOW), {}),
+    ("admin_get_orders", lambda db: crud.admin_get_orders(db), {
+        "orders": "общий COUNT для пагинации читает весь индекс",
+    }),
+    ("admin_get_orders(status)", lambda db: crud.admin_get_orders(db, status="pending"), {}),
+    ("admin_get_orders(q)", lambda db: crud.admin_get_orders(db, q="user 4"), {
+        "users": "ILIKE '%q%' не может использовать индекс",
+        "orders": "общий COUNT для пагинации",
+    }),
+    ("admin_get_customers", lambda db: crud.admin_get_customers(db, cursor=500), {}),
+    ("admin_get_customers(q)", lambda db: crud.admin_get_customers(db, q="7700000012"), {}),
+    ("admin_get_customers(name)", lambda db: crud.admin_get_customers(db, q="user 12"), {}),
+    ("admin_orders_count", lambda db: crud.admin_orders_count(db), {
+        "orders": "COUNT всех заказов",
+    }),
+    ("admin.get_order_details", lambda db: admin.get_order_details(42, db), {}),
+    ("admin.get_orders_details", lambda db: admin.get_orders_details(
+        ",".join(str(i) for i in range(1, 20000, 200)), db), {}),
+    ("get_order_change_seqs", lambda db: crud.get_order_change_seqs(db, list(range(1, 20000, 200))), {}),
+    ("create_order", lambda db: crud.create_order(
+        db, db.get(models.User, 42),
+        schemas.OrderCreate(items=[{"product_id": 1, "quantity": 2, "type_id": 1}], payment_method="cash"),
+    ), {}),
+    ("approve_order", lambda db: crud.approve_order(db, _pending_order_id(db)), {}),
+    ("archive_orders", lambda db: archive_orders(db, older_than_days=200), {}),
+    ("reject_order", lambda db: crud.reject_order(db, _pending_order_id(db)), {}),
+    ("reconcile_loyalty", lambda db: reconcile_loyalty(db, dry_run=True), {
+        "users": "полный пересчёт по всем клиентам",
+        "orders": "полный пересчёт по всем клиентам",
+        "orders_archive": "полный пересчёт по всем клиентам",
+    }),
+]
+
+
+def full_scans(statement: str, plan_rows) -> set[str]:
+    limited = " LIMIT " in statement.upper()
+    scanned = set()
+    for row in plan_rows:
+        detail = row[-1]
+        if not detail.startswith("SCAN "):
+            continue
+        # SCAN по индексу под ORDER BY ... LIMIT останавливается после LIMIT строк
+        if limited and " USING INDEX " in detail:
+            continue
+        # order_items_1 -> order_items (алиасы joinedload)
+        table = re.sub(r"_\d+$", "", detail.split()[1])
+        if table in BIG_TABLES:
+            scanned.add(table)
+    return scanned
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    migrate()
+    db = SessionLocal()
+    seed(db, args.users)
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    failures = 0
+    for name, fn, allowed in CASES:
+        order_details_cache.clear()
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            fn(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        db.rollback()
+
+        case_failed = False
+        with engine.connect() as conn:
+            for statement, parameters in captured:
+                try:
+                    plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+                except OperationalError:
+                    # запрос к временной таблице, которой уже нет на этом соединении
+                    conn.rollback()
+                    continue
+                bad = full_scans(statement, plan) - set(allowed)
+                if args.verbose or bad:
+                    print(f"-- {name}")
+                    print("   " + " ".join(statement.split()))
+                    for row in plan:
+                        print(f"   {row[-1]}")
+                if bad:
+                    case_failed = True
+                    print(f"FAIL {name}: full scan of {', '.join(sorted(bad))}")
+
+        if case_failed:
+            failures += 1
+        else:
+            print(f"ok   {name}")
+
+    db.close()
+    if failures:
+        print(f"{failures} case(s) with query plan regressions")
+        sys.exit(1)
+    print("all query plans use indexes")
+
+
+if __name__ == "__main__":
+    main()